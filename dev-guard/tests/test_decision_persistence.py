@@ -16,6 +16,7 @@ Exit semantics for this hook:
 import importlib.util
 import json
 import subprocess
+import sys
 import types
 from datetime import UTC, datetime, timedelta
 from pathlib import Path
@@ -52,7 +53,7 @@ def run_hook(
     """
     stdin = raw_input if raw_input is not None else json.dumps(payload)
     return subprocess.run(
-        ["uv", "run", str(SCRIPT)],
+        [sys.executable, str(SCRIPT)],
         input=stdin,
         capture_output=True,
         text=True,
@@ -10,6 +10,7 @@ import json
 import os
 import sqlite3
 import subprocess
+import sys
 import textwrap
 import time
 import uuid
@@ -58,7 +59,7 @@ def run_hook(
     if extra_env:
         env.update(extra_env)
     return subprocess.run(
-        ["uv", "run", str(SCRIPT)],
+        [sys.executable, str(SCRIPT)],
         input=json.dumps(payload),
         capture_output=True,
         text=True,
@@ -1100,7 +1101,7 @@ class TestAgentToolSignals:
 class TestMalformedInput:
     def test_empty_stdin_exits_0(self, tmp_path):
         result = subprocess.run(
-            ["uv", "run", str(SCRIPT)],
+            [sys.executable, str(SCRIPT)],
             input="",
             capture_output=True,
             text=True,
@@ -1110,7 +1111,7 @@ class TestMalformedInput:
 
     def test_non_json_stdin_exits_0(self, tmp_path):
         result = subprocess.run(
-            ["uv", "run", str(SCRIPT)],
+            [sys.executable, str(SCRIPT)],
             input="not json at all",
             capture_output=True,
             text=True,
@@ -1120,7 +1121,7 @@ class TestMalformedInput:
 
     def test_json_array_stdin_exits_0(self, tmp_path):
         result = subprocess.run(
-            ["uv", "run", str(SCRIPT)],
+            [sys.executable, str(SCRIPT)],
             input="[1, 2, 3]",
             capture_output=True,
             text=True,
@@ -10,6 +10,7 @@ Block:   exit 0 + {"decision": "block", "reason": "..."} JSON on stdout.
 import json
 import os
 import subprocess
+import sys
 import uuid
 from pathlib import Path
 
@@ -47,7 +48,7 @@ def run_hook(
     if state_path is not None:
         env["SUBAGENT_STOP_HOOK_STATE_PATH"] = str(state_path)
     return subprocess.run(
-        ["uv", "run", str(SCRIPT)],
+        [sys.executable, str(SCRIPT)],
         input=json.dumps(payload),
         capture_output=True,
         text=True,
@@ -1009,7 +1010,7 @@ class TestStdinParsing:
         env = os.environ.copy()
         env["SUBAGENT_STOP_HOOK_STATE_PATH"] = str(tmp_path / "state.json")
         result = subprocess.run(
-            ["uv", "run", str(SCRIPT)],
+            [sys.executable, str(SCRIPT)],
             input="not json at all",
             capture_output=True,
             text=True,
@@ -1024,7 +1025,7 @@ class TestStdinParsing:
         env = os.environ.copy()
         env["SUBAGENT_STOP_HOOK_STATE_PATH"] = str(tmp_path / "state.json")
         result = subprocess.run(
-            ["uv", "run", str(SCRIPT)],
+            [sys.executable, str(SCRIPT)],
             input="[1, 2, 3]",
             capture_output=True,
             text=True,
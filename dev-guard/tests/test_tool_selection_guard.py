@@ -1,22 +1,32 @@
 """Tests for tool-selection-guard.py
 
-Black-box tests: each test invokes the guard script via subprocess,
-feeding it JSON on stdin and asserting exit code + stderr content.
+Black-box tests: each test feeds the guard JSON on stdin and asserts on
+exit code + stderr content. run_guard executes main() in-process against
+a fresh copy of the module; the CLI-mode helpers still spawn the entry
+script via subprocess, using the test interpreter rather than `uv run`
+(the hook scripts are stdlib-only, so uv's environment sync adds nothing).
 """
 
 import datetime
 import importlib.util
+import io
 import json
 import os
 import re
 import sqlite3
 import subprocess
 import sys
+import traceback
+import types
 from pathlib import Path
+from unittest import mock
 
 import pytest
 
 SCRIPT = os.path.join(os.path.dirname(__file__), os.pardir, "hooks", "tool-selection-guard.py")
+MODULE = os.path.join(os.path.dirname(__file__), os.pardir, "hooks", "tool_selection_guard.py")
+# Compiled once per worker; run_guard executes it into a new module each call.
+_GUARD_CODE = compile(Path(MODULE).read_text(), MODULE, "exec")
 
 
 def run_guard(
@@ -26,7 +36,11 @@ def run_guard(
     env: dict | None = None,
     payload_extra: dict | None = None,
 ) -> subprocess.CompletedProcess:
-    """Invoke the guard script with the given tool_name and tool_input.
+    """Invoke the guard with the given tool_name and tool_input.
+
+    Runs main() in-process with stdin/stdout/stderr, argv and os.environ
+    swapped out, and returns a CompletedProcess shaped like the old
+    subprocess result so assertions read the same either way.
 
     payload_extra: additional top-level keys merged into the JSON payload
     (e.g. hook_event_name, tool_response, session_id).
@@ -35,12 +49,40 @@ def run_guard(
     if payload_extra:
         payload_data.update(payload_extra)
     payload = json.dumps(payload_data)
-    return subprocess.run(
-        ["uv", "run", SCRIPT],
-        input=payload,
-        capture_output=True,
-        text=True,
-        env=env,
+    stdin = io.TextIOWrapper(io.BytesIO(payload.encode()), encoding="utf-8")
+    stdout = io.TextIOWrapper(io.BytesIO(), encoding="utf-8", write_through=True)
+    stderr = io.TextIOWrapper(io.BytesIO(), encoding="utf-8", write_through=True)
+    # A fresh module per call, so import-time state (_DB_PATH, RULES with
+    # user rules appended by main(), caches) never leaks between tests.
+    guard = types.ModuleType("tool_selection_guard")
+    guard.__file__ = MODULE
+    with (
+        mock.patch.dict(os.environ, os.environ if env is None else env, clear=True),
+        mock.patch.object(sys, "argv", [SCRIPT]),
+        mock.patch.object(sys, "path", list(sys.path)),
+        mock.patch.multiple(sys, stdin=stdin, stdout=stdout, stderr=stderr),
+    ):
+        try:
+            exec(_GUARD_CODE, guard.__dict__)
+            guard.main()
+            returncode = 0
+        except SystemExit as exc:
+            if exc.code is None or isinstance(exc.code, int):
+                returncode = exc.code or 0
+            else:
+                print(exc.code, file=sys.stderr)
+                returncode = 1
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+            returncode = 1
+        finally:
+            if getattr(guard, "_db_conn", None) is not None:
+                guard._db_conn.close()
+    return subprocess.CompletedProcess(
+        [SCRIPT],
+        returncode,
+        stdout=stdout.buffer.getvalue().decode(),
+        stderr=stderr.buffer.getvalue().decode(),
     )
 
 
@@ -56,8 +98,7 @@ def assert_guard(result, expected_exit, expected_msg=None, test_id=""):
         f"stderr: {result.stderr.strip()!r}"
     )
     if expected_msg:
-        output = result.stderr + result.stdout
-        assert expected_msg in output, (
+        assert expected_msg in result.stderr or expected_msg in result.stdout, (
             f"[{test_id}] Expected '{expected_msg}' in output. stderr: {result.stderr.strip()!r}"
         )
 
@@ -2069,13 +2110,14 @@ class TestWorktreeStash:
 # Unit tests: _parse_branch_creation and _is_safe_start_point
 # ═══════════════════════════════════════════════════════════════════════════════
 
-_spec = importlib.util.spec_from_file_location("tool_selection_guard", SCRIPT)
+_spec = importlib.util.spec_from_file_location("tool_selection_guard", MODULE)
 _mod = importlib.util.module_from_spec(_spec)
 _spec.loader.exec_module(_mod)
 _parse_branch_creation = _mod._parse_branch_creation
 _is_safe_start_point = _mod._is_safe_start_point
 _strip_shell_keyword = _mod.strip_shell_keyword
 _split_pipes = _mod.split_pipes
+_split_commands = _mod.split_commands
 
 
 class TestParseBranchCreation:
@@ -2221,6 +2263,69 @@ class TestIsSafeStartPoint:
         assert _is_safe_start_point(ref) == expected
 
 
+class TestCurrentBranch:
+    """Unit tests for _current_branch (reads HEAD instead of forking git)."""
+
+    @pytest.fixture
+    def fake_git(self, monkeypatch):
+        """Stub `git rev-parse` and record whether it was called."""
+        calls = []
+
+        def run(args, **_kwargs):
+            calls.append(args)
+            return subprocess.CompletedProcess(args, 0, stdout="from-git\n")
+
+        monkeypatch.delenv("GIT_DIR", raising=False)
+        monkeypatch.setattr(_mod.subprocess, "run", run)
+        return calls
+
+    def test_reads_head_from_parent_repo(self, tmp_path, monkeypatch, fake_git):
+        (tmp_path / ".git" / "refs" / "heads").mkdir(parents=True)
+        (tmp_path / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+        (tmp_path / ".git" / "refs" / "heads" / "main").write_text("0" * 40 + "\n")
+        (tmp_path / "sub").mkdir()
+        monkeypatch.chdir(tmp_path / "sub")
+        assert _mod._current_branch() == "main"
+        assert fake_git == []
+
+    def test_follows_worktree_gitdir_pointer(self, tmp_path, monkeypatch, fake_git):
+        wt_git = tmp_path / "repo" / ".git" / "worktrees" / "wt"
+        wt_git.mkdir(parents=True)
+        (wt_git / "HEAD").write_text("ref: refs/heads/feature/x\n")
+        (wt_git / "commondir").write_text("../..\n")
+        (tmp_path / "repo" / ".git" / "packed-refs").write_text(
+            "# pack-refs with: peeled fully-peeled sorted\n" + "0" * 40 + " refs/heads/feature/x\n"
+        )
+        (tmp_path / "wt").mkdir()
+        (tmp_path / "wt" / ".git").write_text("gitdir: ../repo/.git/worktrees/wt\n")
+        monkeypatch.chdir(tmp_path / "wt")
+        assert _mod._current_branch() == "feature/x"
+        assert fake_git == []
+
+    @pytest.mark.parametrize(
+        "head",
+        [
+            "0123456789abcdef0123456789abcdef01234567\n",
+            "ref: refs/heads/.invalid\n",
+            "ref: refs/heads/main\n",
+        ],
+        ids=["detached", "reftable-stub", "unborn"],
+    )
+    def test_falls_back_to_git(self, tmp_path, monkeypatch, fake_git, head):
+        (tmp_path / ".git").mkdir()
+        (tmp_path / ".git" / "HEAD").write_text(head)
+        monkeypatch.chdir(tmp_path)
+        assert _mod._current_branch() == "from-git"
+        assert len(fake_git) == 1
+
+    def test_git_dir_env_falls_back_to_git(self, tmp_path, monkeypatch, fake_git):
+        (tmp_path / ".git").mkdir()
+        (tmp_path / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv("GIT_DIR", str(tmp_path / "elsewhere"))
+        assert _mod._current_branch() == "from-git"
+
+
 class TestSplitPipes:
     """Unit tests for split_pipes parser."""
 
@@ -2258,6 +2363,40 @@ class TestSplitPipes:
         assert _split_pipes(cmd) == expected
 
 
+class TestSplitCommands:
+    """Unit tests for split_commands parser."""
+
+    @pytest.mark.parametrize(
+        "cmd, expected",
+        [
+            ("a && b", ["a", "b"]),
+            ("a || b; c\nd", ["a", "b", "c", "d"]),
+            ("echo 'a && b; c'", ["echo 'a && b; c'"]),
+            ('echo "a || b" && c', ['echo "a || b"', "c"]),
+            ('echo "it\'s" ; b', ['echo "it\'s"', "b"]),
+            ("echo 'unterminated && b", ["echo 'unterminated && b"]),
+            ("a | b &", ["a | b &"]),
+            ("a &&& b", ["a", "& b"]),
+            ("a \\\n  --flag && b", ["a    --flag", "b"]),
+            (";;", []),
+        ],
+        ids=[
+            "and",
+            "or-semicolon-newline",
+            "single-quoted-delimiters",
+            "double-quoted-delimiters",
+            "apostrophe-in-double-quotes",
+            "unterminated-quote",
+            "pipe-and-background-kept",
+            "triple-ampersand",
+            "backslash-continuation",
+            "only-delimiters",
+        ],
+    )
+    def test_split(self, cmd, expected):
+        assert _split_commands(cmd) == expected
+
+
 class TestStripShellKeyword:
     """Unit tests for strip_shell_keyword helper."""
 
@@ -2873,8 +3012,9 @@ class TestExtraCommandRules:
         result = _run_with_extra_cmd_rules("oc get pods", rules_file)
         assert result.returncode == 0
 
-    def test_extra_rule_with_exception(self, tmp_path):
-        """Custom rules with exception pattern allow exception matches."""
+    @pytest.fixture
+    def oc_delete_exception_rules(self, tmp_path):
+        """Rules file with an oc-delete rule that exempts --dry-run."""
         rules = [
             {
                 "name": "oc-delete",
@@ -2885,12 +3025,20 @@ class TestExtraCommandRules:
         ]
         rules_file = tmp_path / "extra-cmd-rules.json"
         rules_file.write_text(json.dumps(rules))
-        # Without exception → blocked
-        result = _run_with_extra_cmd_rules("oc delete pod my-pod", rules_file)
-        assert result.returncode == 2
-        # With exception → allowed
-        result = _run_with_extra_cmd_rules("oc delete pod my-pod --dry-run", rules_file)
-        assert result.returncode == 0
+        return rules_file
+
+    @pytest.mark.parametrize(
+        "command, expected_exit",
+        [
+            ("oc delete pod my-pod", 2),
+            ("oc delete pod my-pod --dry-run", 0),
+        ],
+        ids=["no-exception-blocked", "exception-allowed"],
+    )
+    def test_extra_rule_with_exception(self, oc_delete_exception_rules, command, expected_exit):
+        """Custom rules with exception pattern allow exception matches."""
+        result = _run_with_extra_cmd_rules(command, oc_delete_exception_rules)
+        assert result.returncode == expected_exit
 
     def test_extra_rule_in_chained_commands(self, tmp_path):
         """Custom rules are checked in chained commands (&&, ||, ;)."""
@@ -3211,7 +3359,7 @@ def _run_validate(**env_overrides) -> subprocess.CompletedProcess:
     env.pop("COMMAND_GUARD_EXTRA_RULES", None)
     env.update(env_overrides)
     return subprocess.run(
-        ["uv", "run", SCRIPT, "--validate"],
+        [sys.executable, SCRIPT, "--validate"],
         capture_output=True,
         text=True,
         env=env,
@@ -3820,9 +3968,9 @@ class TestExtraCommandRulesAllow:
 
 def _load_guard_module(tmp_path):
     """Load the guard module with a fresh DB path. Returns the module."""
-    spec = importlib.util.spec_from_file_location("guard_trust", SCRIPT)
-    mod = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(mod)
+    mod = types.ModuleType("guard_trust")
+    mod.__file__ = MODULE
+    exec(_GUARD_CODE, mod.__dict__)
     # Post-exec override needed because module-level _DB_PATH is computed at import time
     mod._DB_PATH = tmp_path / "trust-test.db"
     mod._db_conn = None
@@ -4024,7 +4172,7 @@ class TestTrustCommand:
         env = os.environ.copy()
         env["GUARD_DB_PATH"] = str(tmp_path / "test.db")
         return subprocess.run(
-            ["uv", "run", SCRIPT, "--trust"] + args,
+            [sys.executable, SCRIPT, "--trust"] + args,
             capture_output=True,
             text=True,
             env=env,
@@ -4852,7 +5000,7 @@ class TestGitTrustedDirsValidation:
         env = os.environ.copy()
         env["GIT_TRUSTED_DIRS"] = str(dirs_file)
         result = subprocess.run(
-            ["uv", "run", SCRIPT, "--validate"],
+            [sys.executable, SCRIPT, "--validate"],
             capture_output=True,
             text=True,
             env=env,
@@ -4865,7 +5013,7 @@ class TestGitTrustedDirsValidation:
         env = os.environ.copy()
         env["GIT_TRUSTED_DIRS"] = str(tmp_path / "nonexistent.json")
         result = subprocess.run(
-            ["uv", "run", SCRIPT, "--validate"],
+            [sys.executable, SCRIPT, "--validate"],
             capture_output=True,
             text=True,
             env=env,
@@ -4880,7 +5028,7 @@ class TestGitTrustedDirsValidation:
         env = os.environ.copy()
         env["GIT_TRUSTED_DIRS"] = str(dirs_file)
         result = subprocess.run(
-            ["uv", "run", SCRIPT, "--validate"],
+            [sys.executable, SCRIPT, "--validate"],
             capture_output=True,
             text=True,
             env=env,
@@ -4895,7 +5043,7 @@ class TestGitTrustedDirsValidation:
         env = os.environ.copy()
         env["GIT_TRUSTED_DIRS"] = str(dirs_file)
         result = subprocess.run(
-            ["uv", "run", SCRIPT, "--validate"],
+            [sys.executable, SCRIPT, "--validate"],
             capture_output=True,
             text=True,
             env=env,
@@ -5046,7 +5194,7 @@ class TestUnifiedConfigValidation:
         env = os.environ.copy()
         env["DEV_GUARD_CONFIG"] = str(config_file)
         result = subprocess.run(
-            ["uv", "run", SCRIPT, "--validate"],
+            [sys.executable, SCRIPT, "--validate"],
             capture_output=True,
             text=True,
             env=env,
@@ -5063,7 +5211,7 @@ class TestUnifiedConfigValidation:
         env = os.environ.copy()
         env["DEV_GUARD_CONFIG"] = str(config_file)
         result = subprocess.run(
-            ["uv", "run", SCRIPT, "--validate"],
+            [sys.executable, SCRIPT, "--validate"],
             capture_output=True,
             text=True,
             env=env,
@@ -5079,7 +5227,7 @@ class TestUnifiedConfigValidation:
         env = os.environ.copy()
         env["DEV_GUARD_CONFIG"] = str(config_file)
         result = subprocess.run(
-            ["uv", "run", SCRIPT, "--validate"],
+            [sys.executable, SCRIPT, "--validate"],
             capture_output=True,
             text=True,
             env=env,
@@ -5377,7 +5525,7 @@ class TestRTKConfig:
         config_path.parent.mkdir(parents=True)
         config_path.write_text('[telemetry]\nenabled = true\n\n[tee]\nmode = "failures"\n')
         result = subprocess.run(
-            ["uv", "run", SCRIPT, "--validate"],
+            [sys.executable, SCRIPT, "--validate"],
             capture_output=True,
             text=True,
             env=env,
@@ -5395,7 +5543,7 @@ class TestRTKConfig:
         config_path.parent.mkdir(parents=True)
         config_path.write_text('[telemetry]\nenabled = false\n\n[tee]\nmode = "always"\n')
         result = subprocess.run(
-            ["uv", "run", SCRIPT, "--validate"],
+            [sys.executable, SCRIPT, "--validate"],
             capture_output=True,
             text=True,
             env=env,
@@ -5408,7 +5556,7 @@ class TestRTKConfig:
         env, config_path = rtk_config_env
         assert not config_path.exists()
         result = subprocess.run(
-            ["uv", "run", SCRIPT, "--validate"],
+            [sys.executable, SCRIPT, "--validate"],
             capture_output=True,
             text=True,
             env=env,
@@ -5421,15 +5569,13 @@ class TestRTKConfig:
 
     def test_no_rtk_binary_skips_silently(self, tmp_path):
         """Without rtk on PATH, no config message is emitted."""
-        # Create a minimal PATH with only a uv symlink, no rtk
+        # An empty PATH directory: no rtk to find
         bin_dir = tmp_path / "bin"
         bin_dir.mkdir()
-        uv_real = subprocess.run(["which", "uv"], capture_output=True, text=True).stdout.strip()
-        (bin_dir / "uv").symlink_to(uv_real)
         env = {**os.environ, "PATH": str(bin_dir)}
         env.pop("RTK_DISABLED", None)
         result = subprocess.run(
-            ["uv", "run", SCRIPT, "--validate"],
+            [sys.executable, SCRIPT, "--validate"],
             capture_output=True,
             text=True,
             env=env,
@@ -5449,7 +5595,7 @@ class TestRTKConfig:
         )
         config_path.write_text(original)
         result = subprocess.run(
-            ["uv", "run", SCRIPT, "--validate"],
+            [sys.executable, SCRIPT, "--validate"],
             capture_output=True,
             text=True,
             env=env,
@@ -5492,7 +5638,7 @@ def _run_session_start(env, session_id="test-session", cwd="/test/project"):
     """Run --validate (SessionStart) with session data on stdin."""
     payload = json.dumps({"session_id": session_id, "cwd": cwd})
     return subprocess.run(
-        ["uv", "run", SCRIPT, "--validate"],
+        [sys.executable, SCRIPT, "--validate"],
         input=payload,
         capture_output=True,
         text=True,
@@ -5504,7 +5650,7 @@ def _run_session_end(env, session_id="test-session"):
     """Run --session-end with session data on stdin."""
     payload = json.dumps({"session_id": session_id})
     return subprocess.run(
-        ["uv", "run", SCRIPT, "--session-end"],
+        [sys.executable, SCRIPT, "--session-end"],
         input=payload,
         capture_output=True,
         text=True,
@@ -5641,7 +5787,7 @@ class TestSessionEnd:
         """SessionEnd with no session_id exits cleanly."""
         env, _db_path = session_db
         result = subprocess.run(
-            ["uv", "run", SCRIPT, "--session-end"],
+            [sys.executable, SCRIPT, "--session-end"],
             input="{}",
             capture_output=True,
             text=True,
@@ -5711,7 +5857,7 @@ class TestGuardStats:
             payload_extra={"session_id": "s1"},
         )
         result = subprocess.run(
-            ["uv", "run", GUARD_STATS_SCRIPT, "1"],
+            [sys.executable, GUARD_STATS_SCRIPT, "1"],
             capture_output=True,
             text=True,
             env=env,
@@ -5732,7 +5878,7 @@ class TestGuardStats:
                 payload_extra={"session_id": "s1"},
             )
         result = subprocess.run(
-            ["uv", "run", GUARD_STATS_SCRIPT],
+            [sys.executable, GUARD_STATS_SCRIPT],
             capture_output=True,
             text=True,
             env=env,
@@ -5753,7 +5899,7 @@ class TestGuardStats:
         )
         _run_session_end(env, session_id="s1")
         result = subprocess.run(
-            ["uv", "run", GUARD_STATS_SCRIPT],
+            [sys.executable, GUARD_STATS_SCRIPT],
             capture_output=True,
             text=True,
             env=env,
@@ -5769,7 +5915,7 @@ class TestGuardStats:
             "GUARD_DB_PATH": str(tmp_path / "nonexistent.db"),
         }
         result = subprocess.run(
-            ["uv", "run", GUARD_STATS_SCRIPT],
+            [sys.executable, GUARD_STATS_SCRIPT],
             capture_output=True,
             text=True,
             env=env,
@@ -5783,7 +5929,7 @@ class TestGuardStats:
         # Create DB by running a guard check
         run_guard("Bash", {"command": "date"}, env=env, payload_extra={"session_id": "s1"})
         result = subprocess.run(
-            ["uv", "run", GUARD_STATS_SCRIPT, "-5"],
+            [sys.executable, GUARD_STATS_SCRIPT, "-5"],
             capture_output=True,
             text=True,
             env=env,
@@ -5821,7 +5967,7 @@ class TestGuardStats:
         conn.close()
 
         result = subprocess.run(
-            ["uv", "run", GUARD_STATS_SCRIPT],
+            [sys.executable, GUARD_STATS_SCRIPT],
             capture_output=True,
             text=True,
             env=env,